@@ -0,0 +1,47 @@
+"""Cálculos numéricos do dashboard (index.py).
+
+Ficam em um módulo importado, e não no script do Streamlit, porque o script
+é executado novamente a cada interação: aqui a função compilada pelo Numba é
+criada uma única vez por processo.
+"""
+import numpy as np
+import pandas as pd
+
+# Numba (opcional) para a média por região; sem ele o cálculo usa o groupby do pandas
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+# Função compilada com Numba: soma e contagem por código de categoria, ignorando valores ausentes
+if njit is not None:
+    @njit(cache=True)
+    def medias_por_codigo(codigos, valores, n_categorias):
+        somas = np.zeros(n_categorias)
+        contagens = np.zeros(n_categorias, np.int64)
+        presentes = np.zeros(n_categorias, np.bool_)
+        for i in range(codigos.size):
+            codigo = codigos[i]
+            if codigo < 0:
+                continue
+            presentes[codigo] = True
+            if not np.isnan(valores[i]):
+                somas[codigo] += valores[i]
+                contagens[codigo] += 1
+        medias = np.full(n_categorias, np.nan)
+        for codigo in range(n_categorias):
+            if contagens[codigo] > 0:
+                medias[codigo] = somas[codigo] / contagens[codigo]
+        return medias, presentes
+
+# Função para calcular a média de uma coluna por REGIÃO
+def media_por_regiao(df, coluna):
+    if njit is None or not isinstance(df['REGIÃO'].dtype, pd.CategoricalDtype):
+        return df.groupby('REGIÃO', observed=True)[coluna].mean()
+    categorias = df['REGIÃO'].cat.categories
+    medias, presentes = medias_por_codigo(df['REGIÃO'].cat.codes.to_numpy(),
+                                          df[coluna].to_numpy(dtype=np.float64),
+                                          len(categorias))
+    indice = pd.CategoricalIndex(categorias[presentes], categories=categorias, name='REGIÃO')
+    return pd.Series(medias[presentes], index=indice, name=coluna)
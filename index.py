@@ -1,8 +1,24 @@
 import streamlit as st
+import altair as alt
 import pandas as pd
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Backend sem interface gráfica: as figuras só são salvas/enviadas
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+import os
+from functools import partial
 from io import BytesIO
 
+from calculos import media_por_regiao
+
+# Leitor de Excel em Rust (python-calamine), com openpyxl como alternativa
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
 # Configuração da página Streamlit
 st.set_page_config(
     page_title="Dashboard de Análise",
@@ -19,93 +35,211 @@ st.sidebar.image(logo_url, width=270)
 st.title("📊 Dashboard de Análise de Desempenho por Escola - SAEB/IDEB (2005 - 2023)")
 st.markdown("Bem-vindo ao sistema de acesso aos resultados do IDEB e SAEB.")
 
-# Função para carregar os dados
-@st.cache_data
-def load_data(file_path):
-    df = pd.read_excel(file_path)
-    # Remove colunas Unnamed se existirem
-    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+# Colunas utilizadas em cada base (as demais não são lidas do disco)
+COLUNAS_IDEB = ['INEP', 'ESCOLA', 'REGIÃO', 'EDIÇÃO', 'ETAPA', 'IDEB']
+COLUNAS_SAEB = ['INEP', 'ESCOLA', 'REGIÃO', 'EDIÇÃO', 'ETAPA', 'COMP_CURRICULAR', 'PROFICIENCIA_MEDIA']
+
+# Função para ler a planilha original quando o .parquet não estiver disponível
+# A leitura é guardada em disco (.feather) para os próximos reinícios do app
+def ler_planilha(file_path, colunas):
+    cache_path = file_path + ".feather"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        return pd.read_feather(cache_path, columns=colunas)
+
+    df = pd.read_excel(file_path, engine=EXCEL_ENGINE)
+    df.columns = df.columns.str.strip()
+    df = df[colunas]
+    # Colunas com tipos misturados não são aceitas pelo formato Arrow (células vazias seguem ausentes)
+    for coluna in df.columns[df.dtypes == object]:
+        df[coluna] = df[coluna].astype('string')
+    try:
+        df.reset_index(drop=True).to_feather(cache_path, compression="lz4")
+    except OSError:
+        pass  # Sem permissão de escrita: segue sem o cache em disco
     return df
 
-# Carregamento dos dados
-try:
-    df_ideb = load_data('xls/ideb.xlsx')
-    df_saeb = load_data('xls/saeb.xlsx')
+# Função para obter a versão do arquivo de dados: (caminho, data de modificação)
+# Usada como chave dos caches, que são renovados quando o arquivo é atualizado
+def versao_arquivo(file_path):
+    if not os.path.exists(file_path):
+        return file_path, os.path.getmtime(os.path.splitext(file_path)[0] + '.xlsx')
+    return file_path, os.path.getmtime(file_path)
 
-    # Processamento dos dados
-    df_ideb.columns = df_ideb.columns.str.strip()
-    df_saeb.columns = df_saeb.columns.str.strip()
+# Função para carregar os dados
+# Os arquivos .parquet são gerados a partir das planilhas com tools/xlsx_to_parquet.py
+# max_entries=2: uma versão de cada arquivo (IDEB e SAEB); versões antigas saem da memória
+@st.cache_data(max_entries=2)
+def load_data(versao, colunas):
+    file_path = versao[0]
+    if os.path.exists(file_path):
+        df = pd.read_parquet(file_path, columns=colunas, engine="pyarrow")
+    else:
+        df = ler_planilha(os.path.splitext(file_path)[0] + '.xlsx', colunas)
 
     # Converter colunas numéricas
-    df_ideb['INEP'] = pd.to_numeric(df_ideb['INEP'], errors='coerce').fillna(0).astype(int).astype(str)
-    df_saeb['INEP'] = pd.to_numeric(df_saeb['INEP'], errors='coerce').fillna(0).astype(int).astype(str)
+    df['INEP'] = pd.to_numeric(df['INEP'], errors='coerce').fillna(0).astype(int).astype(str)
+    df['EDIÇÃO'] = pd.to_numeric(df['EDIÇÃO'], errors='coerce').fillna(0).astype('int16')
+    for coluna in ('IDEB', 'PROFICIENCIA_MEDIA'):
+        if coluna in df:
+            # float64 comum (não o Float64 anulável que o texto do Parquet geraria)
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype('float64')
+
+    # Padronização dos dados de REGIÃO (vazios viram ausentes)
+    if 'REGIÃO' in df.columns:
+        regioes = df['REGIÃO'].astype('string').str.strip().str.upper()
+        df['REGIÃO'] = regioes.mask(regioes.isin(['', 'NAN']))
 
-    df_ideb['EDIÇÃO'] = pd.to_numeric(df_ideb['EDIÇÃO'], errors='coerce').fillna(0).astype(int).astype(str)
-    df_saeb['EDIÇÃO'] = pd.to_numeric(df_saeb['EDIÇÃO'], errors='coerce').fillna(0).astype(int).astype(str)
+    # Colunas de baixa cardinalidade como category (filtros e agrupamentos por código inteiro)
+    for coluna in ('ESCOLA', 'ETAPA', 'REGIÃO', 'COMP_CURRICULAR'):
+        if coluna in df:
+            df[coluna] = df[coluna].astype('category')
 
-    df_ideb['IDEB'] = pd.to_numeric(df_ideb['IDEB'], errors='coerce')
-    df_saeb['PROFICIENCIA_MEDIA'] = pd.to_numeric(df_saeb['PROFICIENCIA_MEDIA'], errors='coerce')
+    # Ordena uma única vez: o recorte de uma escola/etapa já sai em ordem de edição
+    return df.sort_values(['ESCOLA', 'ETAPA', 'EDIÇÃO']).reset_index(drop=True)
 
+# Função para listar os valores de uma coluna
+# O cache usa a versão do arquivo de origem e o recorte da base ('completa' ou 'regiao') como chave;
+# o DataFrame (_df) não entra no hash
+# max_entries=12: combinações de base, recorte e coluna usadas pelas três abas
+@st.cache_data(max_entries=12)
+def valores_unicos(versao, recorte, _df, coluna):
+    if isinstance(_df[coluna].dtype, pd.CategoricalDtype):
+        return _df[coluna].cat.categories.tolist()
+    return sorted(_df[coluna].dropna().unique().tolist())
+
+# Função para unir e ordenar os valores de uma coluna nas duas bases
+@st.cache_data(max_entries=2)  # REGIÃO e EDIÇÃO
+def uniao_bases(versao_ideb, versao_saeb, recorte, _df_ideb, _df_saeb, coluna):
+    return sorted(set(valores_unicos(versao_ideb, recorte, _df_ideb, coluna)) |
+                  set(valores_unicos(versao_saeb, recorte, _df_saeb, coluna)))
+
+# Função para indexar a base pelas colunas de filtro (índice ordenado para busca direta)
+# cache_resource devolve o mesmo objeto a cada execução, sem copiar a base
+@st.cache_resource(max_entries=2)  # Um índice por base
+def indexar(versao, _df, chaves):
+    return _df.set_index(list(chaves)).sort_index()
+
+# Função para filtrar a base indexada por uma combinação de chaves
+def filtrar_indexado(df_indexado, chave, colunas):
+    try:
+        return df_indexado.loc[[chave]].reset_index()[colunas]
+    except KeyError:
+        return df_indexado.iloc[:0].reset_index()[colunas]
+
+# Função para manter apenas os registros com REGIÃO informada (usada na aba de regiões)
+@st.cache_resource(max_entries=2)  # Um recorte por base
+def com_regiao(versao, _df):
+    return _df[_df['REGIÃO'].notna()]
+
+# Carregamento dos dados
+ARQUIVO_IDEB = 'xls/ideb.parquet'
+ARQUIVO_SAEB = 'xls/saeb.parquet'
+
+try:
+    VERSAO_IDEB = versao_arquivo(ARQUIVO_IDEB)
+    VERSAO_SAEB = versao_arquivo(ARQUIVO_SAEB)
+    df_ideb = load_data(VERSAO_IDEB, COLUNAS_IDEB)
+    df_saeb = load_data(VERSAO_SAEB, COLUNAS_SAEB)
+    df_ideb_idx = indexar(VERSAO_IDEB, df_ideb, ('ESCOLA', 'ETAPA'))
+    df_saeb_idx = indexar(VERSAO_SAEB, df_saeb, ('ESCOLA', 'ETAPA', 'COMP_CURRICULAR'))
 except FileNotFoundError as e:
     st.error(f"Erro: Arquivo não encontrado: {e.filename}. Verifique os arquivos.")
     st.stop()
 
-# Função para formatar a variação
-def formatar_variacao(valor):
-    if valor > 0:
-        sinal = "▲"
-        cor = "green"
-    elif valor < 0:
-        sinal = "▼"
-        cor = "red"
-    else:
-        sinal = ""
-        cor = "blue"
-    return f'<p style="color:{cor};">{sinal} {valor:.2f}</p>'
+# Função para colorir a coluna de variação (todas as linhas de uma vez)
+def colorir_variacao(valores):
+    valores = valores.to_numpy(dtype=float)
+    return np.select([valores > 0, valores < 0], ['color: green', 'color: red'], 'color: blue')
 
-# Função para criar e exibir gráficos
-def criar_grafico(df, escola_nome, variavel, titulo_variavel, etapa=None, componente=None):
-    if df.empty:
+# Função para exibir a tabela de variação com a coluna 'Variação' colorida e com sinal
+def exibir_variacao(variacao_df):
+    estilo = (variacao_df.style
+              .apply(colorir_variacao, subset=['Variação'])
+              .format(precision=2, na_rep='-')
+              .format('{:+.2f}', subset=['Variação'], na_rep='-'))
+    st.dataframe(estilo, hide_index=True, width='stretch')
+
+# Função para montar o título dos gráficos com informações relevantes
+def titulo_grafico(titulo_variavel, escola_nome, etapa=None, componente=None):
+    titulo = f"{titulo_variavel} - {escola_nome}"
+    if etapa:
+        titulo += f" - {etapa}"
+    if componente:
+        titulo += f" - {componente}"
+    return titulo
+
+# Função para criar o gráfico exibido na página (renderizado no navegador)
+def grafico_linha(df, variavel, titulo_variavel, titulo):
+    base = alt.Chart(df[['EDIÇÃO', variavel]]).encode(
+        x=alt.X('EDIÇÃO:O', title='Edição', axis=alt.Axis(labelAngle=-45)),
+        y=alt.Y(f'{variavel}:Q', title=titulo_variavel, scale=alt.Scale(zero=False)),
+        tooltip=[alt.Tooltip('EDIÇÃO:O', title='Edição'),
+                 alt.Tooltip(f'{variavel}:Q', title=titulo_variavel, format='.1f')],
+    )
+    linha = base.mark_line(point=alt.OverlayMarkDef(size=80), strokeWidth=2)
+    rotulos = base.mark_text(dy=-12, color='black', fontSize=10).encode(
+        text=alt.Text(f'{variavel}:Q', format='.1f'))
+    return (linha + rotulos).properties(title=titulo, height=400)
+
+# Função para criar o PNG do gráfico para download (guardado em cache por combinação de dados)
+@st.cache_data
+def criar_grafico(edicoes, valores, escola_nome, titulo_variavel, etapa=None, componente=None):
+    if not edicoes:
         return None
     
-    # Ordenar edições em ordem crescente
-    edicoes_ordenadas = sorted(df['EDIÇÃO'].unique(), key=lambda x: int(x))
+    # Ordenar edições em ordem crescente (texto apenas para os rótulos do eixo)
+    edicoes_ordenadas = [str(edicao) for edicao in sorted(set(edicoes))]
+    edicoes = [str(edicao) for edicao in edicoes]
     
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.plot(df['EDIÇÃO'], df[variavel], marker='o', linestyle='-', linewidth=2, markersize=8)
+    # Figure criada diretamente (sem pyplot): esta função roda na thread do download,
+    # e o registro global de figuras do pyplot não é seguro entre threads
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(edicoes, valores, marker='o', linestyle='-', linewidth=2, markersize=8)
     
     # Adicionar rótulos de valores
-    for edicao, valor in zip(df['EDIÇÃO'], df[variavel]):
+    for edicao, valor in zip(edicoes, valores):
         ax.text(edicao, valor + 0.05, f'{valor:.1f}', ha='center', va='bottom', color='black', fontsize=10)
     
-    # Configurar título com informações relevantes
-    titulo = f"{titulo_variavel} - {escola_nome}"
-    if etapa:
-        titulo += f" - {etapa}"
-    if componente:
-        titulo += f" - {componente}"
-    
     ax.set_xlabel('Edição', fontsize=12)
     ax.set_ylabel(titulo_variavel, fontsize=12)
-    ax.set_title(titulo)
+    ax.set_title(titulo_grafico(titulo_variavel, escola_nome, etapa, componente))
     ax.set_xticks(edicoes_ordenadas)
     ax.set_xticklabels(edicoes_ordenadas, rotation=45)
     ax.grid(True, linestyle='--', alpha=0.7)
     
-    return fig
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=150, bbox_inches='tight',
+                pil_kwargs={"optimize": True, "compress_level": 6})
+    return buf.getvalue()
 
 # Função para download do gráfico
-def download_grafico(fig, nome_arquivo):
-    buf = BytesIO()
-    fig.savefig(buf, format="png", dpi=300, bbox_inches='tight')
-    buf.seek(0)
+# gerar_png só é chamado quando o usuário clica no botão
+def download_grafico(gerar_png, nome_arquivo):
     st.download_button(
         label="Download do Gráfico",
-        data=buf,
+        data=gerar_png,
         file_name=nome_arquivo,
         mime="image/png"
     )
 
+# Função para contar as escolas distintas por REGIÃO a partir dos códigos das categorias
+def escolas_por_regiao(df):
+    if not (isinstance(df['REGIÃO'].dtype, pd.CategoricalDtype) and
+            isinstance(df['ESCOLA'].dtype, pd.CategoricalDtype)):
+        return df.groupby('REGIÃO', observed=True)['ESCOLA'].nunique()
+    categorias = df['REGIÃO'].cat.categories
+    codigos_regiao = df['REGIÃO'].cat.codes.to_numpy().astype(np.int64)
+    codigos_escola = df['ESCOLA'].cat.codes.to_numpy().astype(np.int64)
+    n_escolas = max(len(df['ESCOLA'].cat.categories), 1)
+    # Cada par (região, escola) vira um único inteiro; os pares distintos são contados por região
+    validos = (codigos_regiao >= 0) & (codigos_escola >= 0)
+    pares = np.unique(codigos_regiao[validos] * n_escolas + codigos_escola[validos])
+    quantidades = np.bincount(pares // n_escolas, minlength=len(categorias))
+    presentes = np.bincount(codigos_regiao[codigos_regiao >= 0], minlength=len(categorias)) > 0
+    indice = pd.CategoricalIndex(categorias[presentes], categories=categorias, name='REGIÃO')
+    return pd.Series(quantidades[presentes], index=indice, name='ESCOLA')
+
 # Criar abas para IDEB e SAEB
 tab1, tab2, tab3 = st.tabs(["📈 IDEB", "📊 SAEB","🗺️ REGIÕES"])
 
@@ -113,26 +247,27 @@ with tab1:
     # Seletores para IDEB
     col1, col2 = st.columns(2)
     with col1:
-        escolas_ideb = df_ideb['ESCOLA'].unique().tolist()
+        escolas_ideb = valores_unicos(VERSAO_IDEB, 'completa', df_ideb, 'ESCOLA')
         escolas_ideb.insert(0, 'TODAS')
         escola_selecionada_ideb = st.selectbox("Selecione a ESCOLA (IDEB)", escolas_ideb)
     with col2:
-        etapas_ideb = df_ideb['ETAPA'].unique().tolist()
+        etapas_ideb = valores_unicos(VERSAO_IDEB, 'completa', df_ideb, 'ETAPA')
         etapa_selecionada_ideb = st.selectbox("Selecione a ETAPA (IDEB)", etapas_ideb)
     
     # Filtrar dados conforme seletores
     if escola_selecionada_ideb == 'TODAS':
-        df_filtrado_ideb = df_ideb.copy()
+        df_filtrado_ideb = df_ideb[df_ideb['ETAPA'] == etapa_selecionada_ideb]
     else:
-        df_filtrado_ideb = df_ideb[df_ideb['ESCOLA'] == escola_selecionada_ideb].copy()
-    
-    df_filtrado_ideb = df_filtrado_ideb[df_filtrado_ideb['ETAPA'] == etapa_selecionada_ideb].copy()
+        df_filtrado_ideb = filtrar_indexado(df_ideb_idx,
+                                            (escola_selecionada_ideb, etapa_selecionada_ideb),
+                                            df_ideb.columns)
     
     if df_filtrado_ideb.empty:
         st.warning("Não há dados disponíveis para esta combinação de filtros no IDEB.")
     else:
-        # Ordena os dados pela coluna 'EDIÇÃO' em ordem crescente
-        df_filtrado_ideb = df_filtrado_ideb.sort_values(by='EDIÇÃO')
+        # Ordena os dados pela coluna 'EDIÇÃO' em ordem crescente (apenas para TODAS as escolas)
+        if not df_filtrado_ideb['EDIÇÃO'].is_monotonic_increasing:
+            df_filtrado_ideb = df_filtrado_ideb.sort_values(by='EDIÇÃO')
 
         # Título com informações completas
         st.subheader(f"Resultados do IDEB - {escola_selecionada_ideb} - {etapa_selecionada_ideb}")
@@ -154,74 +289,72 @@ with tab1:
 
         # Tabela de diferença entre edições
         st.subheader(f"Variação do IDEB - {etapa_selecionada_ideb}")
-        variacao_data = []
-        for i in range(1, len(df_filtrado_ideb)):
-            edicao_atual = df_filtrado_ideb.iloc[i]['EDIÇÃO']
-            edicao_anterior = df_filtrado_ideb.iloc[i - 1]['EDIÇÃO']
-            ideb_atual = df_filtrado_ideb.iloc[i]['IDEB']
-            ideb_anterior = df_filtrado_ideb.iloc[i - 1]['IDEB']
-            diferenca = ideb_atual - ideb_anterior
-
-            variacao_data.append({
-                'Comparação': f"{edicao_atual} - {edicao_anterior}",
-                'Edição Atual': edicao_atual,
-                'IDEB Atual': ideb_atual,
-                'Edição Anterior': edicao_anterior,
-                'IDEB Anterior': ideb_anterior,
-                'Variação': diferenca
+        if len(df_filtrado_ideb) > 1:
+            # Compara cada edição com a anterior de forma vetorizada
+            edicoes = df_filtrado_ideb['EDIÇÃO'].to_numpy()
+            valores = df_filtrado_ideb['IDEB'].to_numpy()
+            variacao_df = pd.DataFrame({
+                'Edição Atual': edicoes[1:],
+                'IDEB Atual': valores[1:],
+                'Edição Anterior': edicoes[:-1],
+                'IDEB Anterior': valores[:-1],
+                'Variação': valores[1:] - valores[:-1],
             })
-
-        if variacao_data:
-            variacao_df = pd.DataFrame(variacao_data)
+            variacao_df['Comparação'] = (variacao_df['Edição Atual'].astype(str) + ' - ' +
+                                         variacao_df['Edição Anterior'].astype(str))
             # Adiciona colunas de ESCOLA e ETAPA
             variacao_df['ESCOLA'] = escola_selecionada_ideb
             variacao_df['ETAPA'] = etapa_selecionada_ideb
             # Reordena as colunas
             variacao_df = variacao_df[['ESCOLA', 'ETAPA', 'Comparação', 'Edição Atual', 'IDEB Atual', 
                                     'Edição Anterior', 'IDEB Anterior', 'Variação']]
-            variacao_df['Variação'] = variacao_df['Variação'].apply(formatar_variacao)
-            st.write(variacao_df.to_html(escape=False, index=False), unsafe_allow_html=True)
+            exibir_variacao(variacao_df)
 
         # Gráficos
         if not df_filtrado_ideb.empty:
             st.subheader(f"Gráfico do IDEB - {etapa_selecionada_ideb}")
-            fig = criar_grafico(df_filtrado_ideb, 
-                              escola_selecionada_ideb, 
-                              'IDEB', 
-                              'IDEB', 
-                              etapa_selecionada_ideb)
-            if fig:
-                st.pyplot(fig)
-                download_grafico(fig, f"IDEB_{escola_selecionada_ideb}_{etapa_selecionada_ideb}.png")
+            st.altair_chart(grafico_linha(df_filtrado_ideb, 
+                                          'IDEB', 
+                                          'IDEB', 
+                                          titulo_grafico('IDEB', escola_selecionada_ideb, etapa_selecionada_ideb)),
+                            width='stretch')
+            download_grafico(partial(criar_grafico,
+                                     tuple(df_filtrado_ideb['EDIÇÃO']), 
+                                     tuple(df_filtrado_ideb['IDEB'].round(3)), 
+                                     escola_selecionada_ideb, 
+                                     'IDEB', 
+                                     etapa_selecionada_ideb),
+                             f"IDEB_{escola_selecionada_ideb}_{etapa_selecionada_ideb}.png")
 
 with tab2:
     # Seletores para SAEB
     col1, col2, col3 = st.columns(3)
     with col1:
-        escolas_saeb = df_saeb['ESCOLA'].unique().tolist()
+        escolas_saeb = valores_unicos(VERSAO_SAEB, 'completa', df_saeb, 'ESCOLA')
         escolas_saeb.insert(0, 'TODAS')
         escola_selecionada_saeb = st.selectbox("Selecione a ESCOLA (SAEB)", escolas_saeb)
     with col2:
-        etapas_saeb = df_saeb['ETAPA'].unique().tolist()
+        etapas_saeb = valores_unicos(VERSAO_SAEB, 'completa', df_saeb, 'ETAPA')
         etapa_selecionada_saeb = st.selectbox("Selecione a ETAPA (SAEB)", etapas_saeb)
     with col3:
-        componentes = df_saeb['COMP_CURRICULAR'].unique().tolist()
+        componentes = valores_unicos(VERSAO_SAEB, 'completa', df_saeb, 'COMP_CURRICULAR')
         componente_selecionado = st.selectbox("Selecione o COMPONENTE CURRICULAR", componentes)
     
     # Filtrar dados conforme seletores
     if escola_selecionada_saeb == 'TODAS':
-        df_filtrado_saeb = df_saeb.copy()
+        df_filtrado_saeb = df_saeb[(df_saeb['ETAPA'] == etapa_selecionada_saeb) & 
+                                   (df_saeb['COMP_CURRICULAR'] == componente_selecionado)]
     else:
-        df_filtrado_saeb = df_saeb[df_saeb['ESCOLA'] == escola_selecionada_saeb].copy()
-    
-    df_filtrado_saeb = df_filtrado_saeb[(df_filtrado_saeb['ETAPA'] == etapa_selecionada_saeb) & 
-                                      (df_filtrado_saeb['COMP_CURRICULAR'] == componente_selecionado)].copy()
+        df_filtrado_saeb = filtrar_indexado(df_saeb_idx,
+                                            (escola_selecionada_saeb, etapa_selecionada_saeb, componente_selecionado),
+                                            df_saeb.columns)
     
     if df_filtrado_saeb.empty:
         st.warning("Não há dados disponíveis para esta combinação de filtros no SAEB.")
     else:
-        # Ordena os dados pela coluna 'EDIÇÃO' em ordem crescente
-        df_filtrado_saeb = df_filtrado_saeb.sort_values(by='EDIÇÃO')
+        # Ordena os dados pela coluna 'EDIÇÃO' em ordem crescente (apenas para TODAS as escolas)
+        if not df_filtrado_saeb['EDIÇÃO'].is_monotonic_increasing:
+            df_filtrado_saeb = df_filtrado_saeb.sort_values(by='EDIÇÃO')
 
         # Título com informações completas
         st.subheader(f"Resultados do SAEB - {escola_selecionada_saeb} - {etapa_selecionada_saeb} - {componente_selecionado}")
@@ -244,25 +377,19 @@ with tab2:
 
         # Tabela de diferença entre edições
         st.subheader(f"Variação da Proficiência Média - {componente_selecionado}")
-        variacao_data_saeb = []
-        for i in range(1, len(df_filtrado_saeb)):
-            edicao_atual = df_filtrado_saeb.iloc[i]['EDIÇÃO']
-            edicao_anterior = df_filtrado_saeb.iloc[i - 1]['EDIÇÃO']
-            proficiencia_atual = df_filtrado_saeb.iloc[i]['PROFICIENCIA_MEDIA']
-            proficiencia_anterior = df_filtrado_saeb.iloc[i - 1]['PROFICIENCIA_MEDIA']
-            diferenca = proficiencia_atual - proficiencia_anterior
-
-            variacao_data_saeb.append({
-                'Comparação': f"{edicao_atual} - {edicao_anterior}",
-                'Edição Atual': edicao_atual,
-                'Proficiência Atual': proficiencia_atual,
-                'Edição Anterior': edicao_anterior,
-                'Proficiência Anterior': proficiencia_anterior,
-                'Variação': diferenca
+        if len(df_filtrado_saeb) > 1:
+            # Compara cada edição com a anterior de forma vetorizada
+            edicoes = df_filtrado_saeb['EDIÇÃO'].to_numpy()
+            valores = df_filtrado_saeb['PROFICIENCIA_MEDIA'].to_numpy()
+            variacao_df_saeb = pd.DataFrame({
+                'Edição Atual': edicoes[1:],
+                'Proficiência Atual': valores[1:],
+                'Edição Anterior': edicoes[:-1],
+                'Proficiência Anterior': valores[:-1],
+                'Variação': valores[1:] - valores[:-1],
             })
-
-        if variacao_data_saeb:
-            variacao_df_saeb = pd.DataFrame(variacao_data_saeb)
+            variacao_df_saeb['Comparação'] = (variacao_df_saeb['Edição Atual'].astype(str) + ' - ' +
+                                              variacao_df_saeb['Edição Anterior'].astype(str))
             # Adiciona colunas de ESCOLA, ETAPA e COMPONENTE
             variacao_df_saeb['ESCOLA'] = escola_selecionada_saeb
             variacao_df_saeb['ETAPA'] = etapa_selecionada_saeb
@@ -270,64 +397,60 @@ with tab2:
             # Reordena as colunas
             variacao_df_saeb = variacao_df_saeb[['ESCOLA', 'ETAPA', 'COMPONENTE', 'Comparação', 'Edição Atual', 
                                                 'Proficiência Atual', 'Edição Anterior', 'Proficiência Anterior', 'Variação']]
-            variacao_df_saeb['Variação'] = variacao_df_saeb['Variação'].apply(formatar_variacao)
-            st.write(variacao_df_saeb.to_html(escape=False, index=False), unsafe_allow_html=True)
+            exibir_variacao(variacao_df_saeb)
 
         # Gráficos
         if not df_filtrado_saeb.empty:
             st.subheader(f"Gráfico de Proficiência Média - {componente_selecionado}")
-            fig_saeb = criar_grafico(df_filtrado_saeb, 
-                                   escola_selecionada_saeb, 
-                                   'PROFICIENCIA_MEDIA', 
-                                   f'Proficiência Média ({componente_selecionado})', 
-                                   etapa_selecionada_saeb,
-                                   componente_selecionado)
-            if fig_saeb:
-                st.pyplot(fig_saeb)
-                download_grafico(fig_saeb, f"SAEB_{escola_selecionada_saeb}_{etapa_selecionada_saeb}_{componente_selecionado}.png")
+            titulo_saeb = f'Proficiência Média ({componente_selecionado})'
+            st.altair_chart(grafico_linha(df_filtrado_saeb, 
+                                          'PROFICIENCIA_MEDIA', 
+                                          titulo_saeb, 
+                                          titulo_grafico(titulo_saeb, escola_selecionada_saeb,
+                                                         etapa_selecionada_saeb, componente_selecionado)),
+                            width='stretch')
+            download_grafico(partial(criar_grafico,
+                                     tuple(df_filtrado_saeb['EDIÇÃO']), 
+                                     tuple(df_filtrado_saeb['PROFICIENCIA_MEDIA'].round(3)), 
+                                     escola_selecionada_saeb, 
+                                     titulo_saeb, 
+                                     etapa_selecionada_saeb,
+                                     componente_selecionado),
+                             f"SAEB_{escola_selecionada_saeb}_{etapa_selecionada_saeb}_{componente_selecionado}.png")
 
 with tab3:
     st.header("📊 Análise por Região")
     
-    # 1. Padronização dos dados de REGIÃO
-    def padronizar_regioes(df):
-        if 'REGIÃO' in df.columns:
-            df['REGIÃO'] = df['REGIÃO'].astype(str).str.strip().str.upper()
-            df = df[~df['REGIÃO'].isin(['NAN', '', 'NaN'])]
-            return df
-        return df
-    
-    df_ideb = padronizar_regioes(df_ideb)
-    df_saeb = padronizar_regioes(df_saeb)
-    
+    # 1. Apenas registros com REGIÃO (já padronizada em load_data)
     if 'REGIÃO' not in df_ideb.columns or 'REGIÃO' not in df_saeb.columns:
         st.error("Erro: A coluna 'REGIÃO' não foi encontrada nos dados.")
         st.stop()
+    
+    df_ideb = com_regiao(VERSAO_IDEB, df_ideb)
+    df_saeb = com_regiao(VERSAO_SAEB, df_saeb)
 
     # 2. Seletores
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        regioes = sorted(list(set(df_ideb['REGIÃO'].unique().tolist() + df_saeb['REGIÃO'].unique().tolist())))
+        regioes = uniao_bases(VERSAO_IDEB, VERSAO_SAEB, 'regiao', df_ideb, df_saeb, 'REGIÃO')
         regioes.insert(0, 'TODAS')  # Adiciona opção TODAS
         regiao_selecionada = st.selectbox("Selecione a REGIÃO", regioes)
     
     # Seletor de Edição (aparece apenas quando selecionar TODAS as regiões)
     edicoes_disponiveis = []
     if regiao_selecionada == 'TODAS':
-        edicoes_ideb = df_ideb['EDIÇÃO'].unique().tolist()
-        edicoes_saeb = df_saeb['EDIÇÃO'].unique().tolist()
-        edicoes_disponiveis = sorted(list(set(edicoes_ideb + edicoes_saeb)))
+        edicoes_disponiveis = uniao_bases(VERSAO_IDEB, VERSAO_SAEB, 'regiao', df_ideb, df_saeb, 'EDIÇÃO')
         edicao_selecionada = st.selectbox("Selecione a EDIÇÃO para comparar regiões", edicoes_disponiveis)
     
     with col2:
         tipo_indicador = st.selectbox("Selecione o Indicador", ['IDEB', 'SAEB'])
     
     with col3:
-        etapas = df_ideb['ETAPA'].unique().tolist() if tipo_indicador == 'IDEB' else df_saeb['ETAPA'].unique().tolist()
+        etapas = valores_unicos(VERSAO_IDEB, 'regiao', df_ideb, 'ETAPA') if tipo_indicador == 'IDEB' else valores_unicos(VERSAO_SAEB, 'regiao', df_saeb, 'ETAPA')
         etapa_selecionada = st.selectbox("Selecione a ETAPA", etapas)
     
     with col4:
-        componentes = ['-'] if tipo_indicador == 'IDEB' else df_saeb['COMP_CURRICULAR'].unique().tolist()
+        componentes = ['-'] if tipo_indicador == 'IDEB' else valores_unicos(VERSAO_SAEB, 'regiao', df_saeb, 'COMP_CURRICULAR')
         componente_selecionado = st.selectbox("Selecione o COMPONENTE", componentes)
 
     # 3. Processamento dos dados
@@ -350,10 +473,10 @@ with tab3:
                 st.warning(f"Não há dados disponíveis para os filtros selecionados.")
             else:
                 # Calcula médias por região
-                df_medias = df_filtrado.groupby('REGIÃO', as_index=False).agg({
-                    coluna_metric: 'mean',
-                    'ESCOLA': pd.Series.nunique
-                }).rename(columns={coluna_metric: 'MEDIA', 'ESCOLA': 'QTD_ESCOLAS'})
+                df_medias = pd.DataFrame({
+                    'MEDIA': media_por_regiao(df_filtrado, coluna_metric),
+                    'QTD_ESCOLAS': escolas_por_regiao(df_filtrado),
+                }).reset_index()
                 
                 df_medias['MEDIA'] = df_medias['MEDIA'].round(2)
                 
@@ -380,6 +503,7 @@ with tab3:
                 # Botão de download
                 buf = BytesIO()
                 fig.savefig(buf, format="png", dpi=120, bbox_inches='tight')
+                plt.close(fig)
                 buf.seek(0)
                 
                 nome_arquivo = f"COMPARATIVO_{tipo_indicador}_EDICAO_{edicao_selecionada}"
@@ -412,10 +536,10 @@ with tab3:
                 st.warning(f"Não há dados disponíveis para os filtros selecionados.")
             else:
                 # Cálculo das médias por edição
-                df_medias = df_filtrado.groupby('EDIÇÃO', as_index=False).agg({
-                    coluna_metric: 'mean',
-                    'ESCOLA': pd.Series.nunique
-                }).rename(columns={'ESCOLA': 'QTD_ESCOLAS', coluna_metric: 'MEDIA'})
+                df_medias = df_filtrado.groupby('EDIÇÃO', as_index=False, observed=True).agg(
+                    MEDIA=(coluna_metric, 'mean'),
+                    QTD_ESCOLAS=('ESCOLA', 'nunique'),
+                )
                 
                 df_medias['MEDIA'] = df_medias['MEDIA'].round(2)
                 
@@ -423,7 +547,7 @@ with tab3:
                 st.subheader(f"Médias de {titulo_metric} - Região {regiao_selecionada}")
                 
                 fig, ax = plt.subplots(figsize=(12, 6))
-                bars = ax.bar(df_medias['EDIÇÃO'], df_medias['MEDIA'], color='skyblue')
+                bars = ax.bar(df_medias['EDIÇÃO'].astype(str), df_medias['MEDIA'], color='skyblue')
                 
                 for bar in bars:
                     height = bar.get_height()
@@ -441,6 +565,7 @@ with tab3:
                 # Botão de download
                 buf = BytesIO()
                 fig.savefig(buf, format="png", dpi=120, bbox_inches='tight')
+                plt.close(fig)
                 buf.seek(0)
                 
                 nome_arquivo = f"{tipo_indicador}_{regiao_selecionada}_{etapa_selecionada}"
@@ -457,18 +582,17 @@ with tab3:
                 # Resumo estatístico
                 st.subheader("📊 Resumo Estatístico")
                 
+                resumo = {
+                    'Qtd Escolas': ('ESCOLA', 'count'),
+                    'Média': (coluna_metric, 'mean'),
+                    'Mínimo': (coluna_metric, 'min'),
+                    'Máximo': (coluna_metric, 'max'),
+                    'Desvio Padrão': (coluna_metric, 'std'),
+                }
                 if tipo_indicador == 'IDEB':
-                    df_resumo = df_filtrado.groupby(['EDIÇÃO', 'ETAPA']).agg({
-                        'ESCOLA': 'count',
-                        'IDEB': ['mean', 'min', 'max', 'std']
-                    }).round(1)
-                    df_resumo.columns = ['Qtd Escolas', 'Média', 'Mínimo', 'Máximo', 'Desvio Padrão']
+                    df_resumo = df_filtrado.groupby(['EDIÇÃO', 'ETAPA'], observed=True).agg(**resumo).round(1)
                 else:
-                    df_resumo = df_filtrado.groupby(['EDIÇÃO', 'ETAPA', 'COMP_CURRICULAR']).agg({
-                        'ESCOLA': 'count',
-                        'PROFICIENCIA_MEDIA': ['mean', 'min', 'max', 'std']
-                    }).round(2)
-                    df_resumo.columns = ['Qtd Escolas', 'Média', 'Mínimo', 'Máximo', 'Desvio Padrão']
+                    df_resumo = df_filtrado.groupby(['EDIÇÃO', 'ETAPA', 'COMP_CURRICULAR'], observed=True).agg(**resumo).round(2)
                 
                 st.dataframe(df_resumo, use_container_width=True)
     
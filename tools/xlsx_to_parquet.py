@@ -0,0 +1,35 @@
+"""Converte as planilhas de xls/ para Parquet, lidas pelo index.py.
+
+Uso (a partir da raiz do projeto):
+    python tools/xlsx_to_parquet.py
+
+Deve ser executado sempre que ideb.xlsx ou saeb.xlsx forem atualizados.
+"""
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+PLANILHAS = ['xls/ideb.xlsx', 'xls/saeb.xlsx']
+
+
+def converter(caminho_xlsx):
+    df = pd.read_excel(caminho_xlsx, engine=EXCEL_ENGINE)
+    # Remove colunas Unnamed e espaços nos nomes das colunas
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    df.columns = df.columns.str.strip()
+    # Colunas com tipos misturados (ex.: números e '-') não são aceitas pelo Parquet;
+    # viram texto mantendo as células vazias como ausentes (o index.py faz a conversão numérica)
+    for coluna in df.columns[df.dtypes == object]:
+        df[coluna] = df[coluna].astype('string')
+    caminho_parquet = caminho_xlsx.rsplit('.', 1)[0] + '.parquet'
+    df.to_parquet(caminho_parquet, engine="pyarrow", compression="zstd", index=False)
+    print(f"{caminho_xlsx} -> {caminho_parquet} ({len(df)} linhas)")
+
+
+if __name__ == '__main__':
+    for planilha in PLANILHAS:
+        converter(planilha)